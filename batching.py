@@ -0,0 +1,112 @@
+"""
+Micro-batching for LLM calls.
+- Coalesces concurrent requests arriving within a short window
+- Hands each batch to a single async handler call
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect concurrent submissions into batches processed by one handler call."""
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int,
+        max_wait_ms: float
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            handler: Coroutine function taking a list of items and returning
+                one result per item, in the same order; an exception returned
+                as a result is raised to that item's caller only
+            max_batch: Maximum number of items per handler call
+            max_wait_ms: Maximum time to wait for a batch to fill up
+        """
+        self._handler = handler
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Submit an item and wait for its result.
+
+        Args:
+            item: Item to pass to the handler
+
+        Returns:
+            The handler's result for this item
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def _ensure_worker(self):
+        """Start the drain task on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._drain())
+
+    async def _drain(self):
+        """Background task: group queued items and dispatch them in batches."""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self._max_wait
+
+            while len(batch) < self._max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Flush in its own task so the next batch can fill up meanwhile
+            task = self._loop.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """
+        Run the handler on a batch and resolve each caller's future.
+
+        Args:
+            batch: List of (item, future) pairs
+        """
+        items = [item for item, _ in batch]
+        logger.info("Dispatching batch of %d item(s)", len(items))
+
+        try:
+            results = await self._handler(items)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Batch handler returned {len(results)} results for {len(items)} items"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -21,6 +21,28 @@ KNOWLEDGE_BASE_PATH = "product_info.txt"
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 
-# ChromaDB Configuration
-CHROMA_COLLECTION_NAME = "techgear_support"
-CHROMA_PERSIST_DIRECTORY = "./chroma_db"
+# Conversation history kept in the RAG prompt, counted in tokens
+MAX_HISTORY_TOKENS = 1024
+
+# Semantic answer cache: minimum cosine similarity for a paraphrase to reuse
+# a cached answer. Questions about different attributes of one product
+# retrieve the same chunks and score above 0.92 with Gemini embeddings, so
+# the cache is off (exact repeats only) unless ANSWER_CACHE_THRESHOLD is set
+# to a value validated against such pairs
+ANSWER_CACHE_THRESHOLD = (
+    float(os.environ["ANSWER_CACHE_THRESHOLD"])
+    if os.getenv("ANSWER_CACHE_THRESHOLD") else None
+)
+
+# Vector Store Configuration
+VECTOR_STORE_PATH = "./vector_store.npz"
+
+# Workflow Configuration
+# Most concurrent queries classified together in one LLM call. Batched
+# queries share a prompt, so one user's text can sway another's category;
+# set CLASSIFY_MAX_BATCH=1 to classify every query in its own call
+CLASSIFY_MAX_BATCH = int(os.getenv("CLASSIFY_MAX_BATCH", "32"))
+
+# Set DEBUG_GRAPH=1 to run queries through the compiled LangGraph graph
+# instead of the inline fast path
+DEBUG_GRAPH = os.getenv("DEBUG_GRAPH", "").lower() in ("1", "true")
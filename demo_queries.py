@@ -11,6 +11,7 @@ Run this script directly without starting the FastAPI server:
     python demo_queries.py
 """
 
+import asyncio
 import logging
 from graph_workflow import run_chatbot_flow
 
@@ -84,7 +85,7 @@ def print_separator():
     print("\n" + "=" * 80 + "\n")
 
 
-def run_demo():
+async def run_demo():
     """Run the demo queries and display results."""
     print("╔════════════════════════════════════════════════════════════════════════════╗")
     print("║           TechGear Support Chatbot - Demo Queries Test                    ║")
@@ -107,7 +108,7 @@ def run_demo():
         
         try:
             # Run the chatbot flow
-            result = run_chatbot_flow(demo["query"], history)
+            result = await run_chatbot_flow(demo["query"], history)
             
             response = result.get("response", "")
             category = result.get("category", "unknown")
@@ -130,4 +131,4 @@ def run_demo():
 
 
 if __name__ == "__main__":
-    run_demo()
+    asyncio.run(run_demo())
@@ -44,13 +44,17 @@ SETUP INSTRUCTIONS:
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict
+import asyncio
+import orjson
 import uvicorn
 import logging
+import time
 
-from graph_workflow import run_chatbot_flow
-from rag_pipeline import get_rag_pipeline
+from graph_workflow import ESCALATION_MESSAGE, HISTORY_WINDOW, run_chatbot_flow, stream_chatbot_flow
+from rag_pipeline import aanswer_with_rag, get_rag_pipeline
 
 # Configure logging
 logging.basicConfig(
@@ -59,10 +63,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
+# Streamed chunks are coalesced into one SSE event per interval (seconds)
+STREAM_FLUSH_INTERVAL = 0.05
+
+# Initialize FastAPI app. Endpoints with a response_model and the default
+# response class are serialized straight to JSON bytes by Pydantic
 app = FastAPI(
     title="TechGear Electronics Support Chatbot",
-    description="RAG-powered customer support chatbot using ChromaDB, LangChain, LangGraph, and Gemini Flash 2.5",
+    description="RAG-powered customer support chatbot using FAISS, LangChain, LangGraph, and Gemini Flash 2.5",
     version="1.0.0"
 )
 
@@ -91,8 +99,8 @@ class ChatRequest(BaseModel):
         description="Optional conversation history for context"
     )
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "query": "What is the price of SmartWatch Pro X?",
                 "history": [
@@ -101,6 +109,7 @@ class ChatRequest(BaseModel):
                 ]
             }
         }
+    )
 
 
 class ChatResponse(BaseModel):
@@ -111,13 +120,18 @@ class ChatResponse(BaseModel):
         description="Query category: products, returns, general, or escalate"
     )
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "response": "The SmartWatch Pro X is priced at ₹15,999.",
                 "category": "products"
             }
         }
+    )
+
+
+# Escalations always get the same reply, so build that response only once
+_ESCALATION_RESPONSE = ChatResponse(response=ESCALATION_MESSAGE, category="escalate")
 
 
 class HealthResponse(BaseModel):
@@ -136,7 +150,7 @@ async def startup_event():
         get_rag_pipeline()
         logger.info("RAG pipeline initialized successfully!")
     except Exception as e:
-        logger.error(f"Error initializing RAG pipeline: {e}")
+        logger.error("Error initializing RAG pipeline: %s", e)
         raise
 
 
@@ -175,21 +189,31 @@ async def chat(request: ChatRequest):
         ChatResponse with chatbot answer and category
     """
     try:
-        logger.info(f"Received query: '{request.query[:100]}...'")
+        logger.info("Received query: '%.100s...'", request.query)
         
-        # Convert history to dict format if provided
+        # Convert history to dict format if provided; only the messages the
+        # workflow uses are copied, by plain attribute access
         history_list = None
         if request.history:
-            history_list = [msg.dict() for msg in request.history]
-            logger.info(f"Request includes {len(history_list)} history messages")
+            history_list = [
+                {"sender": msg.sender, "text": msg.text}
+                for msg in request.history[-HISTORY_WINDOW:]
+            ]
+            logger.info("Request includes %d history messages", len(request.history))
         
         # Run the LangGraph workflow
-        result = run_chatbot_flow(request.query, history_list)
+        result = await run_chatbot_flow(request.query, history_list)
         
         response_text = result.get("response", "")
         category = result.get("category", "")
         
-        logger.info(f"Generated response | Category: {category} | Response length: {len(response_text)} chars")
+        logger.info(
+            "Generated response | Category: %s | Response length: %d chars",
+            category, len(response_text)
+        )
+        
+        if category == "escalate":
+            return _ESCALATION_RESPONSE
         
         return ChatResponse(
             response=response_text,
@@ -197,13 +221,78 @@ async def chat(request: ChatRequest):
         )
     
     except Exception as e:
-        logger.error(f"Error processing query: {e}", exc_info=True)
+        logger.error("Error processing query: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing your query: {str(e)}"
         )
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint; same workflow as /chat, but the answer is sent
+    as Server-Sent Events while Gemini generates it.
+    
+    Each event carries a JSON object with a response text chunk and the
+    query category. The stream ends with a "[DONE]" event.
+    
+    Args:
+        request: ChatRequest with user query and optional conversation history
+        
+    Returns:
+        StreamingResponse of text/event-stream events
+    """
+    logger.info("Received streaming query: '%.100s...'", request.query)
+    
+    history_list = None
+    if request.history:
+        history_list = [
+            {"sender": msg.sender, "text": msg.text}
+            for msg in request.history[-HISTORY_WINDOW:]
+        ]
+    
+    async def event_stream():
+        # Buffer small chunks so the client gets fewer, larger events, but
+        # never hold a buffered chunk longer than the flush interval
+        buffer = []
+        category = ""
+        last_flush = time.monotonic()
+        chunks = stream_chatbot_flow(request.query, history_list).__aiter__()
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(chunks.__anext__())
+                timeout = max(last_flush + STREAM_FLUSH_INTERVAL - time.monotonic(), 0) if buffer else None
+                done, _ = await asyncio.wait((pending,), timeout=timeout)
+                if done:
+                    task, pending = pending, None
+                    try:
+                        chunk = task.result()
+                    except StopAsyncIteration:
+                        break
+                    buffer.append(chunk["response"])
+                    category = chunk["category"]
+                if buffer and time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+                    yield b"data: " + orjson.dumps({"response": "".join(buffer), "category": category}) + b"\n\n"
+                    buffer.clear()
+                    last_flush = time.monotonic()
+            if buffer:
+                yield b"data: " + orjson.dumps({"response": "".join(buffer), "category": category}) + b"\n\n"
+        except Exception as e:
+            logger.error("Error streaming query: %s", e, exc_info=True)
+            yield b"event: error\ndata: " + orjson.dumps({"detail": f"Error processing your query: {str(e)}"}) + b"\n\n"
+            return
+        finally:
+            # The client may disconnect while a chunk is still being awaited
+            if pending is not None:
+                pending.cancel()
+        yield b"data: [DONE]\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 # Optional: Direct RAG endpoint (bypasses classification)
 @app.post("/chat/direct", response_model=ChatResponse)
 async def chat_direct(request: ChatRequest):
@@ -218,25 +307,23 @@ async def chat_direct(request: ChatRequest):
         ChatResponse with RAG-generated answer
     """
     try:
-        from rag_pipeline import answer_with_rag
-        
-        logger.info(f"Direct RAG query: '{request.query[:100]}...'")
+        logger.info("Direct RAG query: '%.100s...'", request.query)
         
         # Convert history to string if provided
         history_str = ""
         if request.history:
             history_lines = []
-            for msg in request.history[-4:]:
+            for msg in request.history[-HISTORY_WINDOW:]:
                 sender = "User" if msg.sender == "user" else "Bot"
                 history_lines.append(f"{sender}: {msg.text}")
             history_str = "\n".join(history_lines)
         
-        response = answer_with_rag(request.query, history_str)
+        response = await aanswer_with_rag(request.query, history_str)
         
         return ChatResponse(response=response, category="direct")
     
     except Exception as e:
-        logger.error(f"Error in direct RAG: {e}", exc_info=True)
+        logger.error("Error in direct RAG: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing your query: {str(e)}"
@@ -3,29 +3,50 @@ TASK 1 & 2: RAG Pipeline Implementation
 - Document loading and vector store creation
 - RAG chain for question answering
 """
-# Fix for SQLite version compatibility on Linux
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-
 import os
+import hashlib
 import logging
-from typing import List, Tuple
+import re
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Tuple
+import tiktoken
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_chroma import Chroma
-from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
 import config
+from semantic_cache import SemanticCache
+from vector_store import FaissVectorStore
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Relevance threshold for retrieved documents
-RELEVANCE_THRESHOLD = 0.4  # Adjust based on your embedding model's score range
+# Relevance threshold for retrieved documents (cosine similarity)
+RELEVANCE_THRESHOLD = 0.58  # Adjust based on your embedding model's score range
+
+# Reply used when retrieval finds no sufficiently relevant context
+FALLBACK_MESSAGE = (
+    "I don't have specific information about that in TechGear's knowledge base. "
+    "Please contact support@techgear.com for more details."
+)
+
+# Blank lines separate logical sections (one product, policy, etc.) in the knowledge base
+SECTION_SEPARATOR_RE = re.compile(r"\n\s*\n")
+
+# Number of chunks embedded per Gemini API request when building the index
+EMBED_BATCH_SIZE = 100
+
+# Rough characters per token, used when the tiktoken encoding is unavailable
+CHARS_PER_TOKEN = 4
+
+# Semantic answer cache size; the threshold is config.ANSWER_CACHE_THRESHOLD
+ANSWER_CACHE_SIZE = 10000
+
+# Exact-match answer cache for verbatim retries, keyed by question and history
+EXACT_CACHE_SIZE = 1000
 
 
 class RAGPipeline:
@@ -33,9 +54,32 @@ class RAGPipeline:
     
     def __init__(self):
         self.vectorstore = None
-        self.retriever = None
         self.rag_chain = None
         self.llm = None
+        self.embeddings = None
+        self._history_encoding = None
+        
+        # Built once and reused for every split
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=config.CHUNK_SIZE,
+            chunk_overlap=config.CHUNK_OVERLAP,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+        
+        # Answers to previous history-free questions, matched by embedding;
+        # None when no threshold is configured
+        self._answer_cache = (
+            SemanticCache(
+                capacity=ANSWER_CACHE_SIZE,
+                threshold=config.ANSWER_CACHE_THRESHOLD
+            )
+            if config.ANSWER_CACHE_THRESHOLD is not None else None
+        )
+        
+        # Verbatim repeats of a question, checked before any embedding call
+        self._exact_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._exact_cache_lock = threading.Lock()
         
     def load_documents(self) -> List[Document]:
         """
@@ -44,7 +88,7 @@ class RAGPipeline:
         Returns:
             List of Document objects
         """
-        logger.info(f"Loading documents from {config.KNOWLEDGE_BASE_PATH}...")
+        logger.info("Loading documents from %s...", config.KNOWLEDGE_BASE_PATH)
         
         if not os.path.exists(config.KNOWLEDGE_BASE_PATH):
             raise FileNotFoundError(f"Knowledge base file not found: {config.KNOWLEDGE_BASE_PATH}")
@@ -52,9 +96,16 @@ class RAGPipeline:
         with open(config.KNOWLEDGE_BASE_PATH, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        # Create a single document
-        documents = [Document(page_content=content, metadata={"source": config.KNOWLEDGE_BASE_PATH})]
-        logger.info(f"Loaded {len(documents)} document(s)")
+        # One document per section, so chunks never straddle two sections
+        sections = [section.strip() for section in SECTION_SEPARATOR_RE.split(content)]
+        documents = [
+            Document(
+                page_content=section,
+                metadata={"source": config.KNOWLEDGE_BASE_PATH, "section": i}
+            )
+            for i, section in enumerate(section for section in sections if section)
+        ]
+        logger.info("Loaded %d document(s)", len(documents))
         return documents
     
     def split_documents(self, documents: List[Document]) -> List[Document]:
@@ -69,65 +120,89 @@ class RAGPipeline:
         """
         logger.info("Splitting documents into chunks...")
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        
-        chunks = text_splitter.split_documents(documents)
-        logger.info(f"Created {len(chunks)} chunks")
+        chunks = self._splitter.split_documents(documents)
+        logger.info("Created %d chunks", len(chunks))
         return chunks
     
-    def create_vector_store(self, chunks: List[Document]) -> Chroma:
+    def create_vector_store(self, chunks: List[Document]) -> FaissVectorStore:
         """
-        Create a ChromaDB vector store from document chunks.
+        Create an in-memory FAISS vector store from document chunks.
         
         Args:
             chunks: List of document chunks
             
         Returns:
-            ChromaDB vector store
+            FAISS vector store
         """
         logger.info("Creating embeddings and vector store...")
         
-        # Initialize Google embeddings
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model=config.EMBEDDING_MODEL,
-            google_api_key=config.GOOGLE_API_KEY
-        )
+        # Embed all chunks up front in batched API calls
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        vectors = get_embeddings().embed_documents(texts, batch_size=EMBED_BATCH_SIZE)
         
-        # Create ChromaDB vector store
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            collection_name=config.CHROMA_COLLECTION_NAME,
-            persist_directory=config.CHROMA_PERSIST_DIRECTORY
-        )
+        vectorstore = FaissVectorStore.from_embeddings(vectors, texts, metadatas)
         
         logger.info("Vector store created successfully")
         return vectorstore
     
+    def knowledge_base_hash(self) -> str:
+        """
+        Fingerprint the knowledge base together with the settings used to index it.
+        
+        Returns:
+            SHA256 hex digest
+        """
+        if not os.path.exists(config.KNOWLEDGE_BASE_PATH):
+            raise FileNotFoundError(f"Knowledge base file not found: {config.KNOWLEDGE_BASE_PATH}")
+        
+        hasher = hashlib.sha256()
+        with open(config.KNOWLEDGE_BASE_PATH, 'rb') as f:
+            hasher.update(f.read())
+        hasher.update(
+            f"|{SECTION_SEPARATOR_RE.pattern}|{config.CHUNK_SIZE}|{config.CHUNK_OVERLAP}"
+            f"|{config.EMBEDDING_MODEL}".encode()
+        )
+        return hasher.hexdigest()
+    
+    def load_vector_store(self, kb_hash: str) -> Optional[FaissVectorStore]:
+        """
+        Load the persisted vector store if it matches the knowledge base.
+        
+        Args:
+            kb_hash: Current knowledge base fingerprint
+            
+        Returns:
+            FAISS vector store, or None if it is missing or stale
+        """
+        vectorstore = FaissVectorStore.load(config.VECTOR_STORE_PATH, kb_hash)
+        if vectorstore is None:
+            logger.info("No up-to-date persisted vector store; rebuilding")
+            return None
+        
+        logger.info("Loaded persisted vector store (knowledge base unchanged)")
+        return vectorstore
+    
     def setup_rag_chain(self):
         """
-        Set up the complete RAG chain with retriever and LLM.
+        Set up the complete RAG chain with vector store and LLM.
         """
         logger.info("Setting up RAG chain...")
         
-        # Load and process documents
-        documents = self.load_documents()
-        chunks = self.split_documents(documents)
-        self.vectorstore = self.create_vector_store(chunks)
-        
-        # Create retriever - we'll use similarity_score_threshold for relevance filtering
-        self.retriever = self.vectorstore.as_retriever(
-            search_type="similarity_score_threshold",
-            search_kwargs={
-                "k": 3,  # Retrieve top 3 relevant chunks
-                "score_threshold": RELEVANCE_THRESHOLD
-            }
-        )
+        # Reuse the persisted index when the knowledge base is unchanged,
+        # otherwise load, split and re-embed the documents
+        kb_hash = self.knowledge_base_hash()
+        self.vectorstore = self.load_vector_store(kb_hash)
+        if self.vectorstore is None:
+            documents = self.load_documents()
+            chunks = self.split_documents(documents)
+            self.vectorstore = self.create_vector_store(chunks)
+            self.vectorstore.save(config.VECTOR_STORE_PATH, kb_hash)
+        
+        # Embed queries once and search the index by vector, so a single
+        # embedding serves both retrieval and the answer cache
+        self.embeddings = get_embeddings()
+        self._embed = self.embeddings.embed_query
         
         # Initialize Gemini Flash 2.5 LLM
         self.llm = ChatGoogleGenerativeAI(
@@ -136,30 +211,37 @@ class RAGPipeline:
             temperature=0.3
         )
         
-        # Create custom prompt for RAG
-        prompt_template = """You are a helpful customer support assistant for TechGear Electronics.
-Use the following context to answer the customer's question accurately and professionally.
-If you don't know the answer based on the context, say so politely.
-
-Context: {context}
-
-Question: {question}
-
-Answer:"""
-        
-        self.prompt = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
+        # Tokenizer for the history budget. tiktoken downloads it on first use,
+        # so load it at startup and estimate from characters if that fails
+        try:
+            self._history_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("Could not load tiktoken encoding; truncating history by characters: %s", e)
+        
+        # Static prompt pieces, joined around context and question per call
+        self._prompt_head = (
+            "You are a helpful customer support assistant for TechGear Electronics.\n"
+            "Use the following context to answer the customer's question accurately and professionally.\n"
+            "If you don't know the answer based on the context, say so politely.\n"
+            "\n"
+            "Context: "
         )
+        self._prompt_mid = "\n\nQuestion: "
+        self._prompt_tail = "\n\nAnswer:"
         
         logger.info("RAG chain setup complete!")
     
-    def retrieve_with_scores(self, question: str) -> Tuple[List[Document], bool]:
+    def retrieve_with_scores(
+        self,
+        question: str,
+        query_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Document], bool]:
         """
         Retrieve documents and determine if context is sufficient.
         
         Args:
             question: User's question
+            query_vector: Optional precomputed embedding of the question
             
         Returns:
             Tuple of (documents, has_reliable_context)
@@ -167,37 +249,111 @@ Answer:"""
         if self.vectorstore is None:
             raise ValueError("Vector store not initialized.")
         
-        # Get documents with similarity scores
-        docs_with_scores = self.vectorstore.similarity_search_with_relevance_scores(
-            question, k=3
-        )
+        if query_vector is None:
+            query_vector = self._embed(question)
         
-        logger.info(f"Retrieved {len(docs_with_scores)} documents")
+        # Get documents with cosine similarity scores
+        docs_with_scores = self.vectorstore.search(query_vector, k=3)
         
         # Check if we have reliable context
-        has_reliable_context = (
-            len(docs_with_scores) > 0 and 
-            docs_with_scores[0][1] >= RELEVANCE_THRESHOLD
-        )
+        best_score = docs_with_scores[0][1] if docs_with_scores else 0.0
+        has_reliable_context = len(docs_with_scores) > 0 and best_score >= RELEVANCE_THRESHOLD
+        
+        # Structured fields for log handlers that emit JSON
+        log_fields = {"docs": len(docs_with_scores), "top_score": best_score}
+        logger.info("Retrieved %d documents", len(docs_with_scores), extra=log_fields)
         
         if has_reliable_context:
-            logger.info(f"Found reliable context with score: {docs_with_scores[0][1]:.3f}")
+            logger.info("Found reliable context with score: %.3f", best_score, extra=log_fields)
         else:
-            best_score = docs_with_scores[0][1] if docs_with_scores else 0.0
-            logger.warning(f"No reliable context found. Best score: {best_score:.3f}")
+            logger.warning("No reliable context found. Best score: %.3f", best_score, extra=log_fields)
         
-        # Extract just the documents
-        docs = [doc for doc, score in docs_with_scores]
+        # Keep only chunks relevant enough to ground the answer
+        docs = [doc for doc, score in docs_with_scores if score >= RELEVANCE_THRESHOLD]
         
         return docs, has_reliable_context
     
-    def answer_with_rag(self, question: str, history: str = "") -> str:
+    def answer_with_rag(
+        self,
+        question: str,
+        history: str = "",
+        retrieved: Optional[Tuple[List[Document], bool]] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> str:
         """
         Answer a question using the RAG chain with conversation history support.
         
         Args:
             question: User's question
             history: Optional conversation history context
+            retrieved: Optional result of retrieve_with_scores computed ahead of time
+            query_vector: Optional precomputed embedding of the question
+            
+        Returns:
+            Generated answer or fallback message
+        """
+        if self.llm is None:
+            raise ValueError("RAG chain not initialized. Call setup_rag_chain() first.")
+        
+        exact_key = self._exact_cache_key(question, history)
+        cached_answer = self._cached_exact_answer(exact_key)
+        if cached_answer is not None:
+            return cached_answer
+        
+        # The vector serves retrieval and the history-free semantic cache
+        if query_vector is None and (retrieved is None or self._uses_answer_cache(history)):
+            query_vector = self._embed(question)
+        answer, prompt_text, chunk_ids = self._prepare_answer(
+            question, history, retrieved, query_vector
+        )
+        if answer is not None:
+            return answer
+        
+        # Generate response using LLM
+        answer = self.llm.invoke(prompt_text).content
+        self._store_answer(exact_key, history, query_vector, chunk_ids, answer)
+        return answer
+    
+    async def aretrieve_with_scores(
+        self,
+        question: str,
+        query_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Document], bool]:
+        """
+        Async version of retrieve_with_scores.
+        
+        Args:
+            question: User's question
+            query_vector: Optional precomputed embedding of the question
+            
+        Returns:
+            Tuple of (documents, has_reliable_context)
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store not initialized.")
+        
+        if query_vector is None:
+            query_vector = await self.embeddings.aembed_query(question)
+        
+        # The in-memory index search is sub-millisecond; run it inline
+        return self.retrieve_with_scores(question, query_vector)
+    
+    async def aanswer_with_rag(
+        self,
+        question: str,
+        history: str = "",
+        retrieved: Optional[Tuple[List[Document], bool]] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> str:
+        """
+        Async version of answer_with_rag; awaits the Gemini calls instead
+        of blocking on them.
+        
+        Args:
+            question: User's question
+            history: Optional conversation history context
+            retrieved: Optional result of retrieve_with_scores computed ahead of time
+            query_vector: Optional precomputed embedding of the question
             
         Returns:
             Generated answer or fallback message
@@ -205,36 +361,269 @@ Answer:"""
         if self.llm is None:
             raise ValueError("RAG chain not initialized. Call setup_rag_chain() first.")
         
-        # Retrieve documents and check relevance
-        docs, has_reliable_context = self.retrieve_with_scores(question)
+        exact_key = self._exact_cache_key(question, history)
+        cached_answer = self._cached_exact_answer(exact_key)
+        if cached_answer is not None:
+            return cached_answer
+        
+        # The vector serves retrieval and the history-free semantic cache
+        if query_vector is None and (retrieved is None or self._uses_answer_cache(history)):
+            query_vector = await self.embeddings.aembed_query(question)
+        answer, prompt_text, chunk_ids = self._prepare_answer(
+            question, history, retrieved, query_vector
+        )
+        if answer is not None:
+            return answer
+        
+        answer = (await self.llm.ainvoke(prompt_text)).content
+        self._store_answer(exact_key, history, query_vector, chunk_ids, answer)
+        return answer
+    
+    async def astream_answer(
+        self,
+        question: str,
+        history: str = "",
+        retrieved: Optional[Tuple[List[Document], bool]] = None,
+        query_vector: Optional[List[float]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming version of aanswer_with_rag; yields the answer in chunks
+        as Gemini generates it. Cached and fallback answers arrive in one chunk.
+        
+        Args:
+            question: User's question
+            history: Optional conversation history context
+            retrieved: Optional result of retrieve_with_scores computed ahead of time
+            query_vector: Optional precomputed embedding of the question
+            
+        Yields:
+            Answer text chunks
+        """
+        if self.llm is None:
+            raise ValueError("RAG chain not initialized. Call setup_rag_chain() first.")
+        
+        exact_key = self._exact_cache_key(question, history)
+        cached_answer = self._cached_exact_answer(exact_key)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+        
+        # The vector serves retrieval and the history-free semantic cache
+        if query_vector is None and (retrieved is None or self._uses_answer_cache(history)):
+            query_vector = await self.embeddings.aembed_query(question)
+        answer, prompt_text, chunk_ids = self._prepare_answer(
+            question, history, retrieved, query_vector
+        )
+        if answer is not None:
+            yield answer
+            return
+        
+        parts = []
+        async for chunk in self.llm.astream(prompt_text):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        
+        # Cache only answers that streamed to completion
+        self._store_answer(exact_key, history, query_vector, chunk_ids, "".join(parts))
+    
+    def _prepare_answer(
+        self,
+        question: str,
+        history: str,
+        retrieved: Optional[Tuple[List[Document], bool]],
+        query_vector: Optional[List[float]]
+    ) -> Tuple[Optional[str], Optional[str], Tuple[str, ...]]:
+        """
+        Shared steps of every answer path short of the LLM call: retrieval,
+        relevance check, semantic cache lookup and prompt building.
+        
+        Args:
+            question: User's question
+            history: Conversation history context, may be empty
+            retrieved: Optional result of retrieve_with_scores computed ahead of time
+            query_vector: Embedding of the question; only None with history and retrieved
+            
+        Returns:
+            Tuple of (answer, prompt_text, chunk_ids); answer is set for cache
+            hits and fallbacks, otherwise prompt_text is ready for the LLM
+        """
+        # Retrieve documents and check relevance, unless already prefetched
+        if retrieved is None:
+            retrieved = self.retrieve_with_scores(question, query_vector)
+        docs, has_reliable_context = retrieved
         
         # If no reliable context, return fallback message
         if not has_reliable_context:
             logger.info("Using fallback response due to insufficient context")
-            return (
-                "I don't have specific information about that in TechGear's knowledge base. "
-                "Please contact support@techgear.com for more details."
-            )
+            return FALLBACK_MESSAGE, None, ()
+        
+        # Follow-ups depend on the conversation, so only history-free
+        # questions are answered from the semantic cache. Similar questions
+        # can be about different products, so a cached answer only counts
+        # when retrieval ranked the same chunks in the same order
+        chunk_ids = tuple(doc.id for doc in docs)
+        if self._uses_answer_cache(history):
+            cached = self._answer_cache.lookup(query_vector)
+            if cached is not None and cached[0] == chunk_ids:
+                logger.info("Semantic answer cache hit")
+                return cached[1], None, chunk_ids
+        
+        return None, self._build_prompt(question, history, docs), chunk_ids
+    
+    def _store_answer(
+        self,
+        exact_key: Tuple[str, str],
+        history: str,
+        query_vector: Optional[List[float]],
+        chunk_ids: Tuple[str, ...],
+        answer: str
+    ):
+        """
+        Cache a generated answer for exact repeats and, without history, paraphrases.
+        
+        Args:
+            exact_key: Key from _exact_cache_key
+            history: Conversation history context, may be empty
+            query_vector: Embedding of the question
+            chunk_ids: Ids of the chunks the answer was grounded in, in rank order
+            answer: Generated answer
+        """
+        # An empty generation (safety block, stream with no content) would
+        # otherwise be served as a hit until evicted
+        if not answer:
+            logger.warning("Not caching empty answer")
+            return
+        self._store_exact_answer(exact_key, answer)
+        if self._uses_answer_cache(history):
+            self._answer_cache.add(query_vector, (chunk_ids, answer))
+    
+    def _uses_answer_cache(self, history: str) -> bool:
+        """Whether a question with this history goes through the semantic answer cache."""
+        return self._answer_cache is not None and not history
+    
+    def _exact_cache_key(self, question: str, history: str) -> Tuple[str, str]:
+        """Key a question and its conversation history for the exact-match cache."""
+        return question.strip().lower(), hashlib.md5(history.encode()).hexdigest()
+    
+    def _cached_exact_answer(self, key: Tuple[str, str]) -> Optional[str]:
+        """
+        Look up a previous answer to the same question and history.
+        
+        Args:
+            key: Key from _exact_cache_key
+            
+        Returns:
+            Cached answer, or None
+        """
+        with self._exact_cache_lock:
+            answer = self._exact_cache.get(key)
+            if answer is not None:
+                self._exact_cache.move_to_end(key)
+        if answer is not None:
+            logger.info("Exact answer cache hit")
+        return answer
+    
+    def _store_exact_answer(self, key: Tuple[str, str], answer: str):
+        """
+        Remember an answer, evicting the least recently used entry when full.
         
+        Args:
+            key: Key from _exact_cache_key
+            answer: Generated answer
+        """
+        with self._exact_cache_lock:
+            self._exact_cache[key] = answer
+            self._exact_cache.move_to_end(key)
+            if len(self._exact_cache) > EXACT_CACHE_SIZE:
+                self._exact_cache.popitem(last=False)
+    
+    def _build_prompt(self, question: str, history: str, docs: List[Document]) -> str:
+        """
+        Build the LLM prompt from retrieved context and conversation history.
+        
+        Args:
+            question: User's question
+            history: Conversation history context, may be empty
+            docs: Retrieved documents
+            
+        Returns:
+            Prompt text
+        """
         # Format context
-        context = "\n\n".join(doc.page_content for doc in docs)
+        context = "\n\n".join([doc.page_content for doc in docs])
         
         # Include history if provided
         if history:
+            # Bound the prompt size no matter how long the conversation gets
+            history, history_tokens, kept_tokens = _truncate_to_tokens(
+                history, config.MAX_HISTORY_TOKENS, self._history_encoding
+            )
             enhanced_question = f"Conversation history:\n{history}\n\nCurrent question: {question}"
-            logger.info(f"Using conversation history (length: {len(history)} chars)")
+            logger.info(
+                "Using conversation history (tokens: %d -> %d)", history_tokens, kept_tokens
+            )
         else:
             enhanced_question = question
         
-        # Generate response using LLM
-        prompt_text = self.prompt.format(context=context, question=enhanced_question)
-        result = self.llm.invoke(prompt_text)
-        
-        return result.content
+        return "".join((
+            self._prompt_head, context, self._prompt_mid, enhanced_question, self._prompt_tail
+        ))
 
 
-# Global instance
+# Global instances
 _rag_pipeline = None
+_rag_pipeline_lock = threading.Lock()
+_embeddings = None
+
+
+def get_embeddings() -> GoogleGenerativeAIEmbeddings:
+    """
+    Get or create the shared embeddings client, so every component embeds
+    through the same underlying Gemini connection.
+    
+    Returns:
+        GoogleGenerativeAIEmbeddings instance
+    """
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = GoogleGenerativeAIEmbeddings(
+            model=config.EMBEDDING_MODEL,
+            google_api_key=config.GOOGLE_API_KEY
+        )
+    return _embeddings
+
+
+def _truncate_to_tokens(
+    text: str,
+    max_tokens: int,
+    encoding: Optional[tiktoken.Encoding]
+) -> Tuple[str, int, int]:
+    """
+    Keep only the newest max_tokens tokens of a text. Uses tiktoken's
+    cl100k_base encoding, which is close enough to Gemini's for budgeting;
+    without an encoding, tokens are estimated from the character count.
+    
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+        encoding: Loaded tiktoken encoding, or None
+        
+    Returns:
+        Tuple of (truncated_text, original_token_count, kept_token_count)
+    """
+    if encoding is None:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        text_tokens = -(-len(text) // CHARS_PER_TOKEN)
+        if len(text) <= max_chars:
+            return text, text_tokens, text_tokens
+        return text[-max_chars:], text_tokens, max_tokens
+    
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text, len(tokens), len(tokens)
+    
+    return encoding.decode(tokens[-max_tokens:]), len(tokens), max_tokens
 
 
 def get_rag_pipeline() -> RAGPipeline:
@@ -246,22 +635,114 @@ def get_rag_pipeline() -> RAGPipeline:
     """
     global _rag_pipeline
     if _rag_pipeline is None:
-        logger.info("Initializing RAG pipeline...")
-        _rag_pipeline = RAGPipeline()
-        _rag_pipeline.setup_rag_chain()
+        # Worker threads may race on the first request; build it only once
+        with _rag_pipeline_lock:
+            if _rag_pipeline is None:
+                logger.info("Initializing RAG pipeline...")
+                pipeline = RAGPipeline()
+                pipeline.setup_rag_chain()
+                _rag_pipeline = pipeline
     return _rag_pipeline
 
 
-def answer_with_rag(question: str, history: str = "") -> str:
+def retrieve_with_scores(
+    question: str,
+    query_vector: Optional[List[float]] = None
+) -> Tuple[List[Document], bool]:
+    """
+    Convenience function to retrieve context for a question.
+    
+    Args:
+        question: User's question
+        query_vector: Optional precomputed embedding of the question
+        
+    Returns:
+        Tuple of (documents, has_reliable_context)
+    """
+    pipeline = get_rag_pipeline()
+    return pipeline.retrieve_with_scores(question, query_vector)
+
+
+async def aretrieve_with_scores(
+    question: str,
+    query_vector: Optional[List[float]] = None
+) -> Tuple[List[Document], bool]:
+    """
+    Async convenience function to retrieve context for a question.
+    
+    Args:
+        question: User's question
+        query_vector: Optional precomputed embedding of the question
+        
+    Returns:
+        Tuple of (documents, has_reliable_context)
+    """
+    pipeline = get_rag_pipeline()
+    return await pipeline.aretrieve_with_scores(question, query_vector)
+
+
+def answer_with_rag(
+    question: str,
+    history: str = "",
+    retrieved: Optional[Tuple[List[Document], bool]] = None,
+    query_vector: Optional[List[float]] = None
+) -> str:
     """
     Convenience function to answer questions using RAG.
     
     Args:
         question: User's question
         history: Optional conversation history
+        retrieved: Optional prefetched result of retrieve_with_scores
+        query_vector: Optional precomputed embedding of the question
         
     Returns:
         Generated answer
     """
     pipeline = get_rag_pipeline()
-    return pipeline.answer_with_rag(question, history)
+    return pipeline.answer_with_rag(question, history, retrieved, query_vector)
+
+
+async def aanswer_with_rag(
+    question: str,
+    history: str = "",
+    retrieved: Optional[Tuple[List[Document], bool]] = None,
+    query_vector: Optional[List[float]] = None
+) -> str:
+    """
+    Async convenience function to answer questions using RAG.
+    
+    Args:
+        question: User's question
+        history: Optional conversation history
+        retrieved: Optional prefetched result of retrieve_with_scores
+        query_vector: Optional precomputed embedding of the question
+        
+    Returns:
+        Generated answer
+    """
+    pipeline = get_rag_pipeline()
+    return await pipeline.aanswer_with_rag(question, history, retrieved, query_vector)
+
+
+async def astream_answer(
+    question: str,
+    history: str = "",
+    retrieved: Optional[Tuple[List[Document], bool]] = None,
+    query_vector: Optional[List[float]] = None
+) -> AsyncIterator[str]:
+    """
+    Convenience function to stream an answer to a question.
+    
+    Args:
+        question: User's question
+        history: Optional conversation history
+        retrieved: Optional result of retrieve_with_scores computed ahead of time
+        query_vector: Optional precomputed embedding of the question
+        
+    Yields:
+        Answer text chunks
+    """
+    pipeline = get_rag_pipeline()
+    async for chunk in pipeline.astream_answer(question, history, retrieved, query_vector):
+        yield chunk
@@ -0,0 +1,91 @@
+"""
+Semantic cache for LLM results.
+- Stores results keyed by L2-normalized query embeddings
+- Cosine-similarity lookup with a bounded LRU eviction policy
+"""
+import threading
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+class SemanticCache:
+    """Bounded LRU cache whose lookups match on embedding cosine similarity."""
+
+    def __init__(self, capacity: int, threshold: float):
+        """
+        Initialize the cache.
+
+        Args:
+            capacity: Maximum number of cached entries
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+        """
+        self.capacity = capacity
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None  # Allocated on first add
+        self._values: List[Any] = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 array."""
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _touch(self, slot: int):
+        """Mark a slot as most recently used."""
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def lookup(self, vector: Sequence[float]) -> Optional[Any]:
+        """
+        Find the cached value for the most similar stored embedding.
+
+        Args:
+            vector: Query embedding
+
+        Returns:
+            Cached value if the best match clears the threshold, otherwise None
+        """
+        vec = self._normalize(vector)
+        with self._lock:
+            if self._size == 0:
+                return None
+
+            scores = self._vectors[:self._size] @ vec
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            self._touch(best)
+            return self._values[best]
+
+    def add(self, vector: Sequence[float], value: Any):
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        Args:
+            vector: Query embedding
+            value: Value to cache
+        """
+        vec = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vec.shape[0]), dtype=np.float32)
+
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vec
+            self._values[slot] = value
+            self._touch(slot)
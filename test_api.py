@@ -1,47 +1,61 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
 
-# Load environment variables
-load_dotenv()
-
-# Get API key
-api_key = os.getenv("GOOGLE_API_KEY")
-print(f"Testing API key: {api_key[:20]}...")
-
-# Configure the API
-genai.configure(api_key=api_key)
-
-# Test 1: List available models
-print("\n✅ Test 1: Listing available models...")
-try:
-    models = list(genai.list_models())
-    print(f"Found {len(models)} models")
-    print("✅ API key is valid for listing models!")
-except Exception as e:
-    print(f"❌ Error listing models: {e}")
-
-# Test 2: Generate simple content
-print("\n✅ Test 2: Generating content with Gemini...")
-try:
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-    response = model.generate_content("Say 'Hello, the API key works!'")
-    print(f"Response: {response.text}")
-    print("✅ API key works for content generation!")
-except Exception as e:
-    print(f"❌ Error generating content: {e}")
-
-# Test 3: Create embeddings
-print("\n✅ Test 3: Creating embeddings...")
-try:
-    result = genai.embed_content(
-        model="models/embedding-001",
-        content="This is a test sentence",
-        task_type="retrieval_document"
-    )
-    print(f"Embedding dimension: {len(result['embedding'])}")
-    print("✅ API key works for embeddings!")
-except Exception as e:
-    print(f"❌ Error creating embeddings: {e}")
-
-print("\n🎉 API key validation complete!")
+
+async def probe_models():
+    """Test 1: List available models."""
+    try:
+        # The SDK has no async list_models; run it in a worker thread
+        models = await asyncio.to_thread(lambda: list(genai.list_models()))
+        print(f"\n✅ Test 1: Found {len(models)} models")
+        print("✅ API key is valid for listing models!")
+    except Exception as e:
+        print(f"\n❌ Test 1: Error listing models: {e}")
+
+
+async def probe_generate():
+    """Test 2: Generate simple content."""
+    try:
+        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        response = await model.generate_content_async("Say 'Hello, the API key works!'")
+        print(f"\n✅ Test 2: Response: {response.text}")
+        print("✅ API key works for content generation!")
+    except Exception as e:
+        print(f"\n❌ Test 2: Error generating content: {e}")
+
+
+async def probe_embed():
+    """Test 3: Create embeddings."""
+    try:
+        result = await genai.embed_content_async(
+            model="models/embedding-001",
+            content="This is a test sentence",
+            task_type="retrieval_document"
+        )
+        print(f"\n✅ Test 3: Embedding dimension: {len(result['embedding'])}")
+        print("✅ API key works for embeddings!")
+    except Exception as e:
+        print(f"\n❌ Test 3: Error creating embeddings: {e}")
+
+
+async def main():
+    # Load environment variables
+    load_dotenv()
+    
+    # Get API key
+    api_key = os.getenv("GOOGLE_API_KEY")
+    print(f"Testing API key: {api_key[:20]}...")
+    
+    # Configure the API
+    genai.configure(api_key=api_key)
+    
+    # Run the three probes concurrently; each prints its result as it settles
+    print("\n⏳ Running model listing, content generation and embedding tests...")
+    await asyncio.gather(probe_models(), probe_generate(), probe_embed(), return_exceptions=True)
+    print("\n🎉 API key validation complete!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
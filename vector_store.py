@@ -0,0 +1,126 @@
+"""
+In-process vector store for the knowledge base.
+- FAISS exact inner-product index over L2-normalized embeddings
+- Persists vectors, texts and metadata to a single .npz file
+"""
+import json
+import os
+import zipfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+
+class FaissVectorStore:
+    """Exact top-k cosine search over chunk embeddings held in RAM."""
+
+    def __init__(self, vectors: np.ndarray, texts: List[str], metadatas: List[Dict]):
+        """
+        Initialize the store.
+
+        Args:
+            vectors: L2-normalized float32 embeddings, one row per chunk
+            texts: Chunk texts
+            metadatas: Chunk metadata dicts
+        """
+        self._vectors = vectors
+        # Row positions double as chunk ids, stable for a given saved store
+        self._documents = [
+            Document(id=str(i), page_content=text, metadata=metadata)
+            for i, (text, metadata) in enumerate(zip(texts, metadatas))
+        ]
+        self._index = faiss.IndexFlatIP(vectors.shape[1])
+        self._index.add(vectors)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @classmethod
+    def from_embeddings(
+        cls,
+        embeddings: Sequence[Sequence[float]],
+        texts: List[str],
+        metadatas: List[Dict]
+    ) -> "FaissVectorStore":
+        """
+        Build a store from raw chunk embeddings.
+
+        Args:
+            embeddings: One embedding per chunk
+            texts: Chunk texts
+            metadatas: Chunk metadata dicts
+
+        Returns:
+            FaissVectorStore instance
+        """
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        return cls(vectors, texts, metadatas)
+
+    def save(self, path: str, kb_hash: str):
+        """
+        Persist the store together with the knowledge base fingerprint.
+
+        Args:
+            path: Target .npz file
+            kb_hash: Fingerprint of the indexed knowledge base
+        """
+        # Write to a temp file and swap it in, so an interrupted save never
+        # leaves a truncated store behind
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                vecs=self._vectors,
+                texts=np.array([doc.page_content for doc in self._documents]),
+                metadata=np.array(json.dumps([doc.metadata for doc in self._documents])),
+                kb_hash=np.array(kb_hash)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, kb_hash: str) -> Optional["FaissVectorStore"]:
+        """
+        Load a persisted store if it was built from the same knowledge base.
+
+        Args:
+            path: .npz file written by save()
+            kb_hash: Current knowledge base fingerprint
+
+        Returns:
+            FaissVectorStore instance, or None if missing, unreadable or stale
+        """
+        try:
+            with np.load(path) as data:
+                if str(data["kb_hash"]) != kb_hash:
+                    return None
+                vectors = np.ascontiguousarray(data["vecs"], dtype=np.float32)
+                texts = data["texts"].tolist()
+                metadatas = json.loads(str(data["metadata"]))
+        except (OSError, EOFError, ValueError, KeyError, TypeError, zipfile.BadZipFile):
+            # Missing, partially written or from an older format; rebuild
+            return None
+
+        return cls(vectors, texts, metadatas)
+
+    def search(self, query_vector: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+        """
+        Find the chunks most similar to a query embedding.
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results
+
+        Returns:
+            List of (document, cosine similarity) pairs, best first
+        """
+        query = np.array([query_vector], dtype=np.float32)
+        faiss.normalize_L2(query)
+        scores, ids = self._index.search(query, k)
+        return [
+            (self._documents[i], float(score))
+            for score, i in zip(scores[0], ids[0])
+            if i >= 0  # FAISS pads with -1 when k exceeds the index size
+        ]
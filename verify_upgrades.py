@@ -29,7 +29,7 @@ print()
 
 features = [
     ("1. Weak Context Handling", [
-        "- Similarity threshold detection (0.4)",
+        "- Similarity threshold detection (cosine 0.58)",
         "- Fallback message for out-of-KB queries",
         "- No hallucinations on unknown topics"
     ]),